@@ -0,0 +1,23 @@
+# gunicorn_conf.py
+# Usage: gunicorn -c gunicorn_conf.py invoicex.app.api:app
+from __future__ import annotations
+
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# WEB_CONCURRENCY lets small hosting plans cap the worker count
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * multiprocessing.cpu_count() + 1))
+
+# Import the app (and joblib-load all models at module import) once in the
+# master, then fork: workers share the read-only model pages copy-on-write
+# instead of each loading their own copy.
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Connections must not be shared across processes; let each worker open its own.
+    from invoicex.app import storage
+    storage.engine.dispose(close=False)
@@ -2,16 +2,111 @@
 from __future__ import annotations
 from pathlib import Path
 from typing import Dict, Tuple, List
+import math
+import threading
 import numpy as np
 import joblib
 
 # Path to the trained IsolationForest model
 ROOT = Path(__file__).resolve().parents[1]
 IFOREST_PATH = ROOT / "models" / "anomaly_iforest.joblib"
+# Optional isotree (C++) forest written by train_models when isotree is installed
+ISOTREE_PATH = ROOT / "models" / "anomaly_isotree.joblib"
 
 # Load the model once
 _IFOREST = joblib.load(IFOREST_PATH)
 
+# {"model": isotree.IsolationForest, "offset": float} or None (isotree missing/not trained)
+try:
+    import isotree  # noqa: F401  (needed to unpickle the model)
+    _ISOTREE = joblib.load(ISOTREE_PATH)
+except Exception:
+    _ISOTREE = None
+
+def _isotree_decision(X: np.ndarray) -> np.ndarray:
+    """
+    isotree's standardized score is 2^(-E[h]/c(n)), higher = more anomalous:
+    the same quantity sklearn negates in score_samples. Subtracting the stored
+    contamination offset puts it on decision_function's scale (higher = more normal).
+    """
+    scores = _ISOTREE["model"].predict(X, output="score")
+    return -np.asarray(scores, dtype=float) - _ISOTREE["offset"]
+
+def _average_path_length(n: int) -> float:
+    """Expected path length of an unsuccessful BST search over n samples (same as sklearn)."""
+    if n <= 1:
+        return 0.0
+    if n == 2:
+        return 1.0
+    return 2.0 * (math.log(n - 1.0) + np.euler_gamma) - 2.0 * (n - 1.0) / n
+
+def _extract_trees(model) -> List[Tuple[list, list, list, list, list]]:
+    """
+    Pull each tree's arrays out once as plain Python lists:
+      (feature, threshold, children_left, children_right, leaf_path_length)
+    leaf_path_length = node depth + c(n_node_samples), i.e. what sklearn adds
+    per tree for a sample ending in that leaf.
+    """
+    trees = []
+    for est in model.estimators_:
+        t = est.tree_
+        left = t.children_left.tolist()
+        right = t.children_right.tolist()
+        n_samples = t.n_node_samples.tolist()
+
+        # Children always have a larger index than their parent
+        depth = [0] * t.node_count
+        for i in range(t.node_count):
+            if left[i] != -1:
+                depth[left[i]] = depth[i] + 1
+                depth[right[i]] = depth[i] + 1
+
+        path_len = [depth[i] + _average_path_length(n_samples[i]) for i in range(t.node_count)]
+        trees.append((t.feature.tolist(), t.threshold.tolist(), left, right, path_len))
+    return trees
+
+# Per-row scoring through sklearn's decision_function pays input validation and
+# one tree.apply() call per estimator; for a single 2-feature row that overhead
+# dominates, so walk the trees directly. Falls back to decision_function for
+# models that don't expose that structure.
+try:
+    _TREES = _extract_trees(_IFOREST)
+    _NORMALIZER = len(_TREES) * _average_path_length(int(_IFOREST.max_samples_))
+    _OFFSET = float(_IFOREST.offset_)
+except Exception:
+    _TREES = None
+
+# One preallocated 1x2 input row per thread (requests may be scored from a
+# thread pool), refilled in place instead of building np.array([[amt, lc]]).
+_SCRATCH = threading.local()
+
+def _scratch_row(amt: float, lc: int) -> np.ndarray:
+    row = getattr(_SCRATCH, "row", None)
+    if row is None:
+        row = _SCRATCH.row = np.empty((1, 2), dtype=np.float64)
+    row[0, 0] = amt
+    row[0, 1] = lc
+    return row
+
+def _decision_score(amt: float, lc: int) -> float:
+    """Same value as _IFOREST.decision_function([[amt, lc]])[0] (higher = more normal)."""
+    if _ISOTREE is not None:
+        return float(_isotree_decision(_scratch_row(amt, lc))[0])
+    if not _TREES:
+        return float(_IFOREST.decision_function(_scratch_row(amt, lc))[0])
+
+    # sklearn trees compare in float32
+    x = (float(np.float32(amt)), float(np.float32(lc)))
+    total = 0.0
+    for feature, threshold, left, right, path_len in _TREES:
+        node = 0
+        while left[node] != -1:
+            node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+        total += path_len[node]
+
+    score = -(2.0 ** (-total / _NORMALIZER)) if _NORMALIZER else -1.0
+    return score - _OFFSET
+
 def _safe_float(x, default=0.0):
     try:
         return float(x)
@@ -24,24 +119,8 @@ def _safe_int(x, default=0):
     except (TypeError, ValueError):
         return default
 
-def score_anomaly(norm: Dict, is_duplicate: bool, missing_count: int) -> Tuple[float, List[str]]:
-    """
-    Compute a fraud/anomaly risk score and reasons.
-
-    IMPORTANT: The IsolationForest was trained on EXACTLY TWO FEATURES:
-      [total_amount, line_count]
-    So we must pass the same two features here, in that order.
-    Then we add small rule-based bumps for duplicates and missing fields.
-    """
-    amt = _safe_float(norm.get("total_amount"))
-    lc = _safe_int(norm.get("line_count"))
-
-    # >>> EXACTLY TWO FEATURES, same as training <<<
-    X = np.array([[amt, lc]], dtype=float)
-
-    # IsolationForest.decision_function: higher = more normal
-    raw = float(_IFOREST.decision_function(X)[0])
-
+def _risk_from_raw(raw: float, is_duplicate: bool, missing_count: int) -> Tuple[float, List[str]]:
+    """Turn a decision_function value into the 0..0.99 risk score + reasons."""
     # Convert to a 0..1 "risk" where higher = riskier
     # (Invert and clip — simple but effective for an MVP)
     base_risk = float(np.clip(0.5 - raw, 0.0, 1.0))
@@ -64,3 +143,43 @@ def score_anomaly(norm: Dict, is_duplicate: bool, missing_count: int) -> Tuple[f
         reasons.append("Looks consistent with past invoices.")
 
     return risk, reasons
+
+def score_anomaly(norm: Dict, is_duplicate: bool, missing_count: int) -> Tuple[float, List[str]]:
+    """
+    Compute a fraud/anomaly risk score and reasons.
+
+    IMPORTANT: The IsolationForest was trained on EXACTLY TWO FEATURES:
+      [total_amount, line_count]
+    So we must pass the same two features here, in that order.
+    Then we add small rule-based bumps for duplicates and missing fields.
+    """
+    amt = _safe_float(norm.get("total_amount"))
+    lc = _safe_int(norm.get("line_count"))
+
+    # >>> EXACTLY TWO FEATURES, same as training <<<
+    # IsolationForest.decision_function: higher = more normal
+    raw = _decision_score(amt, lc)
+
+    return _risk_from_raw(raw, is_duplicate, missing_count)
+
+# Below this many rows the per-row tree walk beats one decision_function call
+_INLINE_MAX_ROWS = 32
+
+def score_anomalies(norms: List[Dict], duplicates: List[bool], missing_counts: List[int]) -> List[Tuple[float, List[str]]]:
+    """Batch version of score_anomaly (same features, same rules, one model call per batch)."""
+    feats = [(_safe_float(n.get("total_amount")), _safe_int(n.get("line_count"))) for n in norms]
+    if not feats:
+        return []
+
+    if _ISOTREE is not None:
+        raws = _isotree_decision(np.array(feats, dtype=float)).tolist()
+    elif _TREES and len(feats) <= _INLINE_MAX_ROWS:
+        raws = [_decision_score(amt, lc) for amt, lc in feats]
+    else:
+        X = np.array(feats, dtype=float)         # (N, 2): [total_amount, line_count]
+        raws = _IFOREST.decision_function(X).tolist()
+
+    return [
+        _risk_from_raw(raw, dup, miss)
+        for raw, dup, miss in zip(raws, duplicates, missing_counts)
+    ]
@@ -0,0 +1,72 @@
+# invoicex/app/cache.py
+from __future__ import annotations
+
+import os
+import time
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import orjson
+
+# Bounded in-process cache for pipeline results (per worker process).
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", "4096"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))  # seconds
+
+_LOCK = threading.Lock()
+_ENTRIES: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()  # key -> (expire_ts, value), LRU order
+_EXPIRY: List[Tuple[float, str]] = []  # min-heap of (expire_ts, key)
+
+
+def payload_key(payload: Dict[str, Any]) -> str:
+    """Stable hash of a request payload (key order does not matter)."""
+    raw = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached value for key, or None if missing/expired."""
+    with _LOCK:
+        entry = _ENTRIES.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _ENTRIES[key]
+            return None
+        _ENTRIES.move_to_end(key)
+        return entry[1]
+
+
+def put(key: str, value: Dict[str, Any]) -> None:
+    """Store value under key, evicting expired entries first, then least recently used."""
+    now = time.monotonic()
+    expire_ts = now + CACHE_TTL
+    with _LOCK:
+        _ENTRIES[key] = (expire_ts, value)
+        _ENTRIES.move_to_end(key)
+        heapq.heappush(_EXPIRY, (expire_ts, key))
+
+        # TTL: pop heap entries that are due; skip stale ones left by re-inserts
+        while _EXPIRY and _EXPIRY[0][0] <= now:
+            ts, k = heapq.heappop(_EXPIRY)
+            entry = _ENTRIES.get(k)
+            if entry is not None and entry[0] == ts:
+                del _ENTRIES[k]
+
+        # Size bound: drop least recently used
+        while len(_ENTRIES) > CACHE_MAXSIZE:
+            _ENTRIES.popitem(last=False)
+
+        # Keep the heap from growing unbounded with keys that were already dropped
+        if len(_EXPIRY) > 2 * CACHE_MAXSIZE:
+            _EXPIRY[:] = [(ts, k) for ts, k in _EXPIRY if k in _ENTRIES and _ENTRIES[k][0] == ts]
+            heapq.heapify(_EXPIRY)
+
+
+def clear() -> None:
+    """Drop all cached entries (useful for tests)."""
+    with _LOCK:
+        _ENTRIES.clear()
+        _EXPIRY.clear()
@@ -1,44 +1,78 @@
 # invoicex/app/classify.py
 from __future__ import annotations
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, List
 from pathlib import Path
+import re
 import joblib
+import numpy as np
 
 MODEL_DIR = Path(__file__).resolve().parents[1] / "models"
 VEC_PATH = MODEL_DIR / "vectorizer.joblib"
 CLS_PATH = MODEL_DIR / "type_classifier.joblib"
+ONNX_PATH = MODEL_DIR / "type_pipeline.onnx"  # optional, exported by scripts/train_models.py
 
-_VEC = None  # lazy cache
-_CLS = None  # lazy cache
+# Heuristic keywords (substring matches, e.g. "item" also hits "items")
+_PRODUCT_RE = re.compile("|".join(["monitor", "keyboard", "product", "item", "pcs"]), re.I)
+_SERVICE_RE = re.compile("|".join(["hours", "service", "consult", "maintenance", "support", "subscription"]), re.I)
 
-def _load_models() -> Tuple[Optional[object], Optional[object]]:
-    global _VEC, _CLS
-    if _VEC is None or _CLS is None:
-        try:
-            _VEC = joblib.load(VEC_PATH)
-            _CLS = joblib.load(CLS_PATH)
-        except Exception:
-            _VEC, _CLS = None, None
-    return _VEC, _CLS
+# Load models once at import (shared with explain.py; with a preloading
+# server the pages are inherited by forked workers). None if unavailable.
+try:
+    VEC = joblib.load(VEC_PATH)
+    CLS = joblib.load(CLS_PATH)
+except Exception:
+    VEC, CLS = None, None
+
+# Optional: the same pipeline as one ONNX Runtime graph (tokenize + TF-IDF +
+# logistic regression in C++). Only used with the joblib models, which still
+# provide the class order and the features for explain.py.
+try:
+    import onnxruntime as ort
+    _SESSION = ort.InferenceSession(str(ONNX_PATH), providers=["CPUExecutionProvider"])
+except Exception:
+    _SESSION = None
+
+def _predict_proba(texts: List[str]) -> np.ndarray:
+    """N x C class probabilities, via ONNX Runtime when available."""
+    if _SESSION is not None:
+        return _SESSION.run(["probabilities"], {"input": np.array(texts, dtype=object)})[0]
+    return CLS.predict_proba(VEC.transform(texts))
 
 def predict_type(text: str) -> Tuple[str, float, Dict[str, float]]:
-    vec, cls = _load_models()
-    if vec is not None and cls is not None:
-        X = vec.transform([text or ""])
-        if hasattr(cls, "predict_proba"):
-            probs = cls.predict_proba(X)[0]
-            classes = list(cls.classes_)
+    if VEC is not None and CLS is not None:
+        if hasattr(CLS, "predict_proba"):
+            probs = _predict_proba([text or ""])[0]
+            classes = list(CLS.classes_)
             by_class = {c: float(p) for c, p in zip(classes, probs)}
             best_idx = int(probs.argmax())
             return classes[best_idx], float(probs[best_idx]), by_class
         # fallback if classifier has no proba
-        label = cls.predict(X)[0]
+        label = CLS.predict(VEC.transform([text or ""]))[0]
         return str(label), 1.0, {str(label): 1.0}
 
     # Heuristic fallback if models not available
-    t = (text or "").lower()
-    if any(w in t for w in ["monitor", "keyboard", "product", "item", "pcs"]):
+    # (case-insensitive regex search: no lowered copy of the text)
+    if not text:
+        return "other", 0.5, {"other": 0.5}
+    if _PRODUCT_RE.search(text):
         return "product-based", 0.7, {"product-based": 0.7}
-    if any(w in t for w in ["hours", "service", "consult", "maintenance", "support", "subscription"]):
+    if _SERVICE_RE.search(text):
         return "service-based", 0.7, {"service-based": 0.7}
     return "other", 0.5, {"other": 0.5}
+
+def predict_types(texts: List[str]) -> List[Tuple[str, float, Dict[str, float]]]:
+    """Batch version of predict_type: one transform + one predict_proba for all texts."""
+    if not texts:
+        return []
+    if VEC is None or CLS is None or not hasattr(CLS, "predict_proba"):
+        return [predict_type(t) for t in texts]
+
+    probs = _predict_proba([t or "" for t in texts])  # N x C
+    best = probs.argmax(axis=1)
+    classes = list(CLS.classes_)
+
+    out: List[Tuple[str, float, Dict[str, float]]] = []
+    for row, b in zip(probs, best):
+        by_class = {c: float(p) for c, p in zip(classes, row)}
+        out.append((classes[b], float(row[b]), by_class))
+    return out
@@ -1,11 +1,32 @@
 # invoicex/app/etl.py
 from __future__ import annotations
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, NamedTuple
 from datetime import datetime
+import re
 
 # Map Arabic-Indic digits to ASCII (e.g., ١٢٣ -> 123)
 ARABIC_INDIC = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")
-ARABIC_INDIC_CHARS = set("٠١٢٣٤٥٦٧٨٩")
+
+# Per-language number normalization, each applied in a single translate() pass
+NUMBER_TRANS = {
+    # Arabic digits -> ASCII, drop thousands (٬ and ","), decimal ٫ -> "."
+    "ar": {**ARABIC_INDIC, ord("٬"): None, ord("٫"): ".", ord(","): None},
+    # drop thousands ".", decimal "," -> "."
+    "de": str.maketrans({".": None, ",": "."}),
+    # drop thousands ","
+    "en": str.maketrans({",": None}),
+}
+
+# Numeric dates: ISO year-first (dash only) or day/month first with a 4-digit year
+_DATE_YMD_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+_DATE_XYY_RE = re.compile(r"(\d{1,2})([-./])(\d{1,2})\2(\d{4})")
+
+class NormalizedItem(NamedTuple):
+    """One parsed line item (a tuple: far smaller than a 4-key dict per line)."""
+    description: str
+    quantity: int
+    unit_price: float
+    category: str
 
 def _strip(s: Optional[str]) -> str:
     return str(s or "").strip()
@@ -20,22 +41,7 @@ def _normalize_number_str(num: str, lang: str) -> str:
     - ar: ١٬٢٣٤٫٥٦ -> 1234.56 (also converts Arabic digits)
     - en: 1,234.56  -> 1234.56
     """
-    s = _strip(num)
-
-    if lang == "ar":
-        s = _ar_digits_to_ascii(s)
-        s = s.replace("٬", "")  # thousands
-        s = s.replace("٫", ".") # decimal
-        s = s.replace(",", "")  # safety
-        return s
-
-    if lang == "de":
-        s = s.replace(".", "")  # thousands
-        s = s.replace(",", ".") # decimal
-        return s
-
-    # Default EN: remove commas (thousands)
-    return s.replace(",", "")
+    return _strip(num).translate(NUMBER_TRANS.get(lang, NUMBER_TRANS["en"]))
 
 def _to_float(v: Any, lang: str) -> Optional[float]:
     if v is None:
@@ -60,13 +66,34 @@ def _parse_date_localized(date_str: str, lang: str) -> Optional[str]:
     if not raw:
         return None
 
-    # Always normalize Arabic-Indic digits if present (even if lang != "ar")
-    if any(c in ARABIC_INDIC_CHARS for c in raw):
-        raw = _ar_digits_to_ascii(raw)
-
-    # Normalize Arabic punctuation if present
+    # Normalize Arabic-Indic digits (no-op for ASCII input) and Arabic punctuation
+    raw = raw.translate(ARABIC_INDIC)
     raw = raw.replace("٫", ".").replace("٬", "")
 
+    # Fast path: one regex match + a datetime() constructor instead of a
+    # cascade of strptime attempts. Same outcomes as the formats below.
+    m = _DATE_YMD_RE.fullmatch(raw)
+    if m:
+        candidates = [(int(m.group(1)), int(m.group(2)), int(m.group(3)))]
+    else:
+        m = _DATE_XYY_RE.fullmatch(raw)
+        if m:
+            a, sep, b, y = int(m.group(1)), m.group(2), int(m.group(3)), int(m.group(4))
+            if sep == ".":
+                candidates = [(y, b, a)]              # d.m.Y only
+            elif lang in ("de", "ar"):
+                candidates = [(y, b, a), (y, a, b)]   # day-first, then month-first
+            else:
+                candidates = [(y, a, b), (y, b, a)]   # month-first, then day-first
+    if m:
+        for y, mo, d in candidates:
+            try:
+                return datetime(y, mo, d).strftime("%Y-%m-%d")
+            except ValueError:
+                pass
+        return None
+
+    # Last resort for anything the regexes don't cover
     patterns = {
         "en": ["%Y-%m-%d", "%m/%d/%Y", "%m-%d-%Y", "%d/%m/%Y", "%d-%m-%Y"],
         "de": ["%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d"],
@@ -100,7 +127,8 @@ def normalize(payload: Dict[str, Any], lang: str) -> Dict[str, Any]:
 
     # Items + totals
     raw_items = payload.get("items") or []
-    items: List[Dict[str, Any]] = []
+    items: List[NormalizedItem] = []
+    descs: List[str] = []   # non-empty descriptions, for full_text
     total_amount = 0.0
 
     for it in raw_items:
@@ -114,24 +142,21 @@ def normalize(payload: Dict[str, Any], lang: str) -> Dict[str, Any]:
             qty = 1
 
         unit_price = _to_float(it.get("unit_price", 0.0), lang) or 0.0
-        items.append({
-            "description": desc,
-            "quantity": qty,
-            "unit_price": unit_price,
-            "category": _strip(it.get("category")),
-        })
+        items.append(NormalizedItem(desc, qty, unit_price, _strip(it.get("category"))))
         total_amount += qty * unit_price
+        if desc:
+            descs.append(desc)
 
     line_count = len(items)
 
-    # text used by the classifier
-    full_text_parts = [
-        vendor_name, invoice_number, tax_id, currency,
-        *(it["description"] for it in items if it.get("description")),
-        _strip(payload.get("raw_text"))
-    ]
-    if lang == "ar":
-        full_text_parts = [_ar_digits_to_ascii(p) for p in full_text_parts]
+    # text used by the classifier: one join over the non-empty parts, then
+    # Arabic-Indic digits -> ASCII in a single pass (other codepoints untouched)
+    raw_text = _strip(payload.get("raw_text"))
+    parts = [p for p in (vendor_name, invoice_number, tax_id, currency) if p]
+    parts += descs
+    if raw_text:
+        parts.append(raw_text)
+    full_text = " ".join(parts).translate(ARABIC_INDIC)
 
     return {
         "vendor_name": vendor_name,
@@ -142,5 +167,5 @@ def normalize(payload: Dict[str, Any], lang: str) -> Dict[str, Any]:
         "currency": currency,
         "total_amount": round(total_amount, 2) if line_count else None,
         "line_count": line_count,
-        "full_text": " ".join([p for p in full_text_parts if p]),
+        "full_text": full_text,
     }
@@ -1,25 +1,17 @@
 # invoicex/app/explain.py
 from __future__ import annotations
-from typing import Dict, Any, Optional, List, Tuple
-from pathlib import Path
+from typing import Dict, Any, List
 import numpy as np
-import joblib
 
-# lazy caches
-_VEC = None
-_CLS = None
+# Same artifacts as the classifier (loaded once at import in classify.py)
+from .classify import VEC, CLS
 
-def _load_artifacts() -> Tuple[Optional[object], Optional[object]]:
-    """Load TF-IDF vectorizer and classifier once (if available)."""
-    global _VEC, _CLS
-    if _VEC is None or _CLS is None:
-        try:
-            root = Path(__file__).resolve().parents[1] / "models"
-            _VEC = joblib.load(root / "vectorizer.joblib")
-            _CLS = joblib.load(root / "type_classifier.joblib")
-        except Exception:
-            _VEC, _CLS = None, None
-    return _VEC, _CLS
+# Feature index -> token string, and the coefficient matrix, built once
+try:
+    FEATURE_NAMES = np.asarray(VEC.get_feature_names_out())
+except Exception:
+    FEATURE_NAMES = None
+COEFS = np.asarray(CLS.coef_) if CLS is not None and hasattr(CLS, "coef_") else None
 
 def _top_token_contributions(text: str, top_k: int = 5) -> List[Dict[str, float]]:
     """
@@ -28,8 +20,8 @@ def _top_token_contributions(text: str, top_k: int = 5) -> List[Dict[str, float]
 
     For linear models: contribution ≈ tfidf_value(token) * coef_for_predicted_class(token)
     """
-    vec, cls = _load_artifacts()
-    if vec is None or cls is None:
+    vec, cls = VEC, CLS
+    if vec is None or cls is None or COEFS is None:
         return []
 
     X = vec.transform([text or ""])              # 1 x V sparse TF-IDF
@@ -41,29 +33,32 @@ def _top_token_contributions(text: str, top_k: int = 5) -> List[Dict[str, float]
     else:
         class_idx = int(cls.predict(X)[0] == getattr(cls, "classes_", [None])[0])
 
-    # Extract coefficients for the predicted class
-    # LogisticRegression.coef_: shape (n_classes, n_features) in multi-class
-    coefs = cls.coef_[class_idx]                 # shape (V,)
     # Non-zero columns in the current doc
     X_csr = X.tocsr()
     indices = X_csr.indices
-    data = X_csr.data
+    if indices.size == 0:
+        return []
 
-    # Map feature index -> token string
-    try:
-        feature_names = np.array(vec.get_feature_names_out())
-    except Exception:
-        feature_names = None
+    # LogisticRegression.coef_: shape (n_classes, n_features) in multi-class
+    w = COEFS[class_idx, indices] * X_csr.data   # per-token contribution
 
-    contribs: List[Tuple[str, float]] = []
-    for idx, tfidf_val in zip(indices, data):
-        w = float(coefs[idx]) * float(tfidf_val)
-        token = feature_names[idx] if feature_names is not None else f"feat_{idx}"
-        contribs.append((token, w))
+    # Top_k by absolute contribution: O(n) partition for the k-th magnitude,
+    # then sort only the selected k. Ties go to the earlier column, exactly
+    # like the stable list.sort this replaced.
+    mag = np.abs(w)
+    k = min(top_k, w.size)
+    kth = -np.partition(-mag, k - 1)[k - 1]
+    above = np.flatnonzero(mag > kth)
+    ties = np.flatnonzero(mag == kth)[: k - above.size]
+    sel = np.concatenate([above, ties])
+    order = sel[np.lexsort((sel, -mag[sel]))]
 
-    # Sort by absolute contribution magnitude, take top_k
-    contribs.sort(key=lambda t: abs(t[1]), reverse=True)
-    top = contribs[:top_k]
+    # Only the selected indices get turned into token strings
+    if FEATURE_NAMES is not None:
+        tokens = FEATURE_NAMES[indices[order]].tolist()
+    else:
+        tokens = [f"feat_{idx}" for idx in indices[order].tolist()]
+    top = list(zip(tokens, w[order].tolist()))
 
     # Normalize weights to a friendly scale (optional)
     if top:
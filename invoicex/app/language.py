@@ -1,6 +1,7 @@
 # invoicex/app/language.py
 from __future__ import annotations
 from typing import Dict, Any
+from functools import lru_cache
 from langdetect import detect, DetectorFactory
 
 # Make detection deterministic (same input -> same result)
@@ -8,30 +9,43 @@ DetectorFactory.seed = 0
 
 SUPPORTED = {"en", "de", "ar"}
 
+# Detection only looks at the start of the text; results are memoized on it
+HEAD_CHARS = 256
+# Latin-script fallback texts (vendor + number + currency) shorter than this
+# are too short to tell en from de; non-ASCII ones (e.g. Arabic) still get detected
+MIN_FALLBACK_CHARS = 20
+
 def _whitelist(code: str) -> str:
     """Return only en/de/ar; anything else falls back to 'en'."""
     code = (code or "").lower()
     return code if code in SUPPORTED else "en"
 
+@lru_cache(maxsize=8192)
+def _detect_cached(text_head: str) -> str:
+    """langdetect is deterministic (seeded above), so identical heads can share a result."""
+    try:
+        return _whitelist(detect(text_head))
+    except Exception:
+        return "en"
+
 def detect_language(payload: Dict[str, Any]) -> str:
     """
     1) If 'language' is already in the payload, trust it (but whitelist it).
-    2) Else detect from raw_text; if missing, build a tiny text from other fields.
+    2) Else detect from raw_text; if missing, build a tiny text from other fields
+       (short Latin-only fallback text -> 'en', it is too short to be meaningful).
     3) On any error, return 'en' so the pipeline stays stable.
     """
     if payload.get("language"):
         return _whitelist(str(payload["language"]))
 
-    text = payload.get("raw_text") or " ".join([
-        str(payload.get("vendor_name") or ""),
-        str(payload.get("invoice_number") or ""),
-        str(payload.get("currency") or ""),
-    ]).strip()
-
+    text = payload.get("raw_text")
     if not text:
-        return "en"
+        text = " ".join([
+            str(payload.get("vendor_name") or ""),
+            str(payload.get("invoice_number") or ""),
+            str(payload.get("currency") or ""),
+        ]).strip()
+        if len(text) < MIN_FALLBACK_CHARS and text.isascii():
+            return "en"
 
-    try:
-        return _whitelist(detect(text))
-    except Exception:
-        return "en"
+    return _detect_cached(str(text)[:HEAD_CHARS])
@@ -2,14 +2,16 @@
 from __future__ import annotations
 
 import os
-import json
 import uuid
 import datetime as dt
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Tuple, Optional, List
 
+import orjson
 from sqlalchemy import (
-    create_engine, Column, String, Text, DateTime, UniqueConstraint, select
+    create_engine, Column, String, Text, DateTime, Float, UniqueConstraint, select,
+    func, case, inspect, text, event
 )
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.exc import IntegrityError
 
@@ -25,6 +27,37 @@ engine = create_engine(
 SessionLocal = sessionmaker(bind=engine, future=True)
 Base = declarative_base()
 
+# SQLite tuning, applied on every new DB-API connection:
+# WAL lets readers run during a write and needs fewer fsyncs per commit;
+# synchronous=NORMAL is safe with WAL (a crash can only lose the last commits).
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",   # 256 MiB
+    "cache_size=-65536",     # 64 MiB (negative = KiB)
+)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_conn, _conn_record) -> None:
+        cur = dbapi_conn.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cur.execute(f"PRAGMA {pragma}")
+        cur.close()
+
+# orjson: same output as the stdlib json with ensure_ascii=False, several times
+# faster. The options keep parity for numpy scalars and non-str keys.
+_JSON_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _dumps(obj: Any) -> str:
+    return orjson.dumps(obj, option=_JSON_OPTS).decode("utf-8")
+
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING
+_CONFLICT_INSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
 
 class InvoiceRow(Base):
     """
@@ -38,16 +71,52 @@ class InvoiceRow(Base):
     invoice_number = Column(String, nullable=False)
     raw_json = Column(Text, nullable=False)         # original request payload
     processed_json = Column(Text)                   # pipeline result payload
-    created_at = Column(DateTime, default=dt.datetime.utcnow)
+    fraud_score = Column(Float, index=True)         # copied from processed_json for SQL aggregation
+    created_at = Column(DateTime, default=dt.datetime.utcnow, index=True)
 
     __table_args__ = (
         UniqueConstraint("vendor_name", "invoice_number", name="uix_vendor_invoice"),
     )
 
 
+_DB_READY = False
+
+
+def _migrate() -> None:
+    """Bring tables created by older versions up to date (adds + backfills fraud_score)."""
+    cols = {c["name"] for c in inspect(engine).get_columns(InvoiceRow.__tablename__)}
+    if "fraud_score" in cols:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE invoices ADD COLUMN fraud_score FLOAT"))
+        rows = conn.execute(
+            text("SELECT id, processed_json FROM invoices WHERE processed_json IS NOT NULL")
+        ).all()
+        for iid, pjson in rows:
+            conn.execute(
+                text("UPDATE invoices SET fraud_score = :score WHERE id = :id"),
+                {"score": _fraud_score_of(pjson), "id": iid},
+            )
+        for idx in InvoiceRow.__table__.indexes:
+            idx.create(conn, checkfirst=True)
+
+
 def init_db() -> None:
-    """Create tables if they don't exist."""
+    """Create tables if they don't exist (once per process)."""
+    global _DB_READY
+    if _DB_READY:
+        return
     Base.metadata.create_all(engine)
+    _migrate()
+    _DB_READY = True
+
+
+def _fraud_score_of(pjson: Optional[str]) -> Optional[float]:
+    """fraud_score from a processed JSON string; None if absent/broken."""
+    try:
+        return float(orjson.loads(pjson).get("fraud_score") or 0.0)
+    except Exception:
+        return None
 
 
 def insert_raw_or_get(data: Dict[str, Any]) -> Tuple[str, bool]:
@@ -59,12 +128,37 @@ def insert_raw_or_get(data: Dict[str, Any]) -> Tuple[str, bool]:
     """
     init_db()
     iid = str(uuid.uuid4())
-    row = InvoiceRow(
-        id=iid,
-        vendor_name=(data.get("vendor_name") or ""),
-        invoice_number=(data.get("invoice_number") or ""),
-        raw_json=json.dumps(data, ensure_ascii=False),
+    vendor_name = data.get("vendor_name") or ""
+    invoice_number = data.get("invoice_number") or ""
+    values = {
+        "id": iid,
+        "vendor_name": vendor_name,
+        "invoice_number": invoice_number,
+        "raw_json": _dumps(data),
+    }
+    existing_id = select(InvoiceRow.id).where(
+        InvoiceRow.vendor_name == vendor_name,
+        InvoiceRow.invoice_number == invoice_number,
     )
+
+    insert = _CONFLICT_INSERT.get(engine.dialect.name)
+    if insert is not None and engine.dialect.insert_returning:
+        # INSERT ... ON CONFLICT DO NOTHING RETURNING id: no exception on duplicates
+        stmt = (
+            insert(InvoiceRow)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=["vendor_name", "invoice_number"])
+            .returning(InvoiceRow.id)
+        )
+        with SessionLocal.begin() as s:
+            new_id = s.execute(stmt).scalar()
+            if new_id is not None:
+                return new_id, True
+            existing = s.execute(existing_id).scalar()
+        if existing is not None:
+            return existing, False
+
+    row = InvoiceRow(**values)
     try:
         with SessionLocal.begin() as s:
             s.add(row)
@@ -72,12 +166,7 @@ def insert_raw_or_get(data: Dict[str, Any]) -> Tuple[str, bool]:
     except IntegrityError:
         # UNIQUE constraint hit — fetch the existing row id
         with SessionLocal() as s:
-            existing = s.execute(
-                select(InvoiceRow.id).where(
-                    InvoiceRow.vendor_name == (data.get("vendor_name") or ""),
-                    InvoiceRow.invoice_number == (data.get("invoice_number") or ""),
-                )
-            ).first()
+            existing = s.execute(existing_id).first()
             if existing:
                 return existing[0], False
             # In the unlikely case we can't find it, re-raise for visibility
@@ -90,13 +179,74 @@ def insert_raw(data: Dict[str, Any]) -> str:
     return iid
 
 
+def insert_many_raw_or_get(items: List[Dict[str, Any]]) -> List[Tuple[str, bool]]:
+    """
+    Batch version of insert_raw_or_get: one lookup for existing keys and one
+    transaction for all new rows. Returns (invoice_id, created_flag) per item,
+    in input order. A repeated (vendor_name, invoice_number) inside the batch
+    is reported as a duplicate of its first occurrence.
+    """
+    init_db()
+    keys = [((d.get("vendor_name") or ""), (d.get("invoice_number") or "")) for d in items]
+    if not keys:
+        return []
+
+    with SessionLocal() as s:
+        found = s.execute(
+            select(InvoiceRow.vendor_name, InvoiceRow.invoice_number, InvoiceRow.id).where(
+                InvoiceRow.vendor_name.in_({k[0] for k in keys}),
+                InvoiceRow.invoice_number.in_({k[1] for k in keys}),
+            )
+        ).all()
+    ids: Dict[Tuple[str, str], str] = {(v, n): iid for v, n, iid in found}
+
+    results: List[Tuple[str, bool]] = []
+    new_rows: List[InvoiceRow] = []
+    for key, data in zip(keys, items):
+        if key in ids:
+            results.append((ids[key], False))
+            continue
+        iid = str(uuid.uuid4())
+        ids[key] = iid
+        new_rows.append(InvoiceRow(
+            id=iid,
+            vendor_name=key[0],
+            invoice_number=key[1],
+            raw_json=_dumps(data),
+        ))
+        results.append((iid, True))
+
+    if new_rows:
+        try:
+            with SessionLocal.begin() as s:
+                s.add_all(new_rows)
+        except IntegrityError:
+            # Lost a race with a concurrent insert — resolve item by item
+            return [insert_raw_or_get(d) for d in items]
+    return results
+
+
 def upsert_processed(iid: str, processed: Dict[str, Any]) -> None:
     """Attach/overwrite the processed JSON for a given invoice id."""
     init_db()
     with SessionLocal.begin() as s:
         row = s.get(InvoiceRow, iid)
         if row:
-            row.processed_json = json.dumps(processed, ensure_ascii=False)
+            row.processed_json = _dumps(processed)
+            row.fraud_score = float(processed.get("fraud_score") or 0.0)
+
+
+def upsert_processed_many(processed: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """Batch version of upsert_processed: all (id, payload) pairs in one transaction."""
+    if not processed:
+        return
+    init_db()
+    with SessionLocal.begin() as s:
+        for iid, out in processed:
+            row = s.get(InvoiceRow, iid)
+            if row:
+                row.processed_json = _dumps(out)
+                row.fraud_score = float(out.get("fraud_score") or 0.0)
 
 
 def get_raw(iid: str) -> Optional[Dict[str, Any]]:
@@ -105,7 +255,14 @@ def get_raw(iid: str) -> Optional[Dict[str, Any]]:
         row = s.get(InvoiceRow, iid)
         if not row:
             return None
-        return json.loads(row.raw_json)
+        return orjson.loads(row.raw_json)
+
+
+def _month_key(column):
+    """SQL expression formatting a timestamp as YYYY-MM for the current dialect."""
+    if engine.dialect.name == "sqlite":
+        return func.strftime("%Y-%m", column)
+    return func.to_char(column, "YYYY-MM")
 
 
 def summaries(threshold: float = 0.7) -> Dict[str, Any]:
@@ -117,42 +274,41 @@ def summaries(threshold: float = 0.7) -> Dict[str, Any]:
       - top_vendors
       - monthly_totals: {YYYY-MM: count}
       - monthly_anomalies_over_threshold: {YYYY-MM: n}
+    Aggregation runs in SQL over the fraud_score column; no JSON is parsed.
     """
+    init_db()
+    is_anom = case((InvoiceRow.fraud_score > threshold, 1), else_=0)
+    month = _month_key(InvoiceRow.created_at)
+
     with SessionLocal() as s:
-        rows = s.execute(
-            select(InvoiceRow.created_at, InvoiceRow.vendor_name, InvoiceRow.processed_json)
+        total, anomalies = s.execute(
+            select(func.count(), func.coalesce(func.sum(is_anom), 0)).select_from(InvoiceRow)
+        ).one()
+
+        top_vendors = [
+            (vendor, n) for vendor, n in s.execute(
+                select(InvoiceRow.vendor_name, func.count())
+                .group_by(InvoiceRow.vendor_name)
+                .order_by(func.count().desc(), func.min(InvoiceRow.created_at))
+                .limit(10)
+            ).all()
+        ]
+
+        monthly = s.execute(
+            select(month, func.count(), func.sum(is_anom)).group_by(month)
         ).all()
 
-    total = len(rows)
-    anomalies = 0
-    vendors: Dict[str, int] = {}
     monthly_totals: Dict[str, int] = {}
     monthly_anoms: Dict[str, int] = {}
-
-    for created_at, vendor, pjson in rows:
-        vendors[vendor] = vendors.get(vendor, 0) + 1
-
-        month_key = "unknown"
-        if isinstance(created_at, dt.datetime):
-            month_key = created_at.strftime("%Y-%m")
-        monthly_totals[month_key] = monthly_totals.get(month_key, 0) + 1
-
-        if pjson:
-            try:
-                pj = json.loads(pjson)
-                score = float(pj.get("fraud_score") or 0.0)
-                if score > threshold:
-                    anomalies += 1
-                    monthly_anoms[month_key] = monthly_anoms.get(month_key, 0) + 1
-            except Exception:
-                # ignore broken JSONs silently in summary
-                pass
-
-    top_vendors = sorted(vendors.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    for month_key, n, n_anom in monthly:
+        month_key = month_key or "unknown"
+        monthly_totals[month_key] = int(n)
+        if n_anom:
+            monthly_anoms[month_key] = int(n_anom)
 
     return {
-        "total": total,
-        "anomalies_over_0_7": anomalies,
+        "total": int(total),
+        "anomalies_over_0_7": int(anomalies),
         "top_vendors": top_vendors,
         "monthly_totals": dict(sorted(monthly_totals.items())),
         "monthly_anomalies_over_threshold": dict(sorted(monthly_anoms.items())),
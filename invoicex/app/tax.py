@@ -1,6 +1,6 @@
 # invoicex/app/tax.py
 from __future__ import annotations
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Tuple, Optional
 import re
 
 # --- Demo standard VAT rate tables (subset for MVP) ---
@@ -29,22 +29,51 @@ CURRENCY_TO_GCC = {
 
 # --- Explicit textual cues ----------------------------------------------
 # Exemption (EU/GCC): reverse charge / Article 196 / explicit "VAT exempt"
-_EXEMPT_PATTERNS = [
-    r"\breverse\s*charge\b",
-    r"\barticle\s*196\b",
-    r"\bvat[-\s]*exempt\b",
-]
+_EXEMPT_PATTERNS = {
+    "reverse_charge": r"\breverse\s*charge\b",
+    "article_196": r"\barticle\s*196\b",
+    "vat_exempt": r"\bvat[-\s]*exempt\b",
+}
 
 # Zero-rated: explicit "zero-rated" / "0% VAT" or clear export/international transport cue
-_ZERO_RATED_PATTERNS = [
-    r"\bzero[-\s]*rated\b",
-    r"\bvat\s*0%|\b0%\s*vat\b",
-    r"\bexport\b.*\b(outside|to)\s*(eu|gcc)\b",
-    r"\binternational\s*transport(ation)?\b",
-]
+_ZERO_RATED_PATTERNS = {
+    "zero_rated": r"\bzero[-\s]*rated\b",
+    "zero_percent": r"\bvat\s*0%|\b0%\s*vat\b",
+    "export": r"\bexport\b.*\b(?:outside|to)\s*(?:eu|gcc)\b",
+    "international_transport": r"\binternational\s*transport(?:ation)?\b",
+}
+
+
+def _alternation(patterns: Dict[str, str]) -> "re.Pattern[str]":
+    """One regex per category: a single search instead of one per pattern."""
+    return re.compile("|".join(f"(?P<{name}>{p})" for name, p in patterns.items()), re.I)
+
+
+EXEMPT_RE = _alternation(_EXEMPT_PATTERNS)
+ZERO_RATED_RE = _alternation(_ZERO_RATED_PATTERNS)
+
+# Individual patterns, only consulted once the combined search found a cue
+EXEMPT_PATTERNS = {k: re.compile(p, re.I) for k, p in _EXEMPT_PATTERNS.items()}
+ZERO_RATED_PATTERNS = {k: re.compile(p, re.I) for k, p in _ZERO_RATED_PATTERNS.items()}
 
-EXEMPT_PATTERNS = [re.compile(p, re.I) for p in _EXEMPT_PATTERNS]
-ZERO_RATED_PATTERNS = [re.compile(p, re.I) for p in _ZERO_RATED_PATTERNS]
+
+def _find_cue(combined: "re.Pattern[str]", patterns: Dict[str, "re.Pattern[str]"], text: str) -> Optional[str]:
+    """
+    Return the matched cue text, or None.
+    One combined search decides whether any cue is present (the common case
+    is none). On a hit, earlier-listed patterns still take precedence over
+    the leftmost match so the reported cue is the same as checking them in order.
+    """
+    m = combined.search(text)
+    if not m:
+        return None
+    for name, pat in patterns.items():
+        if name == m.lastgroup:
+            return m.group(0)
+        hit = pat.search(text)
+        if hit:
+            return hit.group(0)
+    return m.group(0)
 
 
 def _decide_region_and_rate(norm: Dict[str, Any]) -> Tuple[str, float, str]:
@@ -91,26 +120,24 @@ def classify_vat(norm: Dict[str, Any]) -> Dict[str, Any]:
 
     # 2) Look for explicit exemptions (override to 0%)
     text = f"{(norm.get('raw_text') or '')} {(norm.get('full_text') or '')}"
-    for pat in EXEMPT_PATTERNS:
-        m = pat.search(text)
-        if m:
-            return {
-                "region": region,
-                "vat": "exempt",
-                "rate": 0.0,
-                "reason": f"Detected exemption keyword (“{m.group(0)}”).",
-            }
+    cue = _find_cue(EXEMPT_RE, EXEMPT_PATTERNS, text)
+    if cue:
+        return {
+            "region": region,
+            "vat": "exempt",
+            "rate": 0.0,
+            "reason": f"Detected exemption keyword (“{cue}”).",
+        }
 
     # 3) Look for explicit zero-rating cues (override to 0%)
-    for pat in ZERO_RATED_PATTERNS:
-        m = pat.search(text)
-        if m:
-            return {
-                "region": region if region != "Unknown" else "Unknown",
-                "vat": "zero-rated",
-                "rate": 0.0,
-                "reason": f"Detected zero-rated cue (“{m.group(0)}”).",
-            }
+    cue = _find_cue(ZERO_RATED_RE, ZERO_RATED_PATTERNS, text)
+    if cue:
+        return {
+            "region": region if region != "Unknown" else "Unknown",
+            "vat": "zero-rated",
+            "rate": 0.0,
+            "reason": f"Detected zero-rated cue (“{cue}”).",
+        }
 
     # 4) Apply standard rate for the decided region
     if region == "EU" and cc_hint in EU_STANDARD:
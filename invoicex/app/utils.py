@@ -1,15 +1,24 @@
 # invoicex/app/utils.py
 from __future__ import annotations
-from typing import Dict, Any, List
+from typing import Dict, Any, Sequence
 
-def _is_missing(v: Any) -> bool:
-    if v is None:
-        return True
-    if isinstance(v, str):
-        return v.strip() == ""
-    if isinstance(v, (list, dict, tuple, set)):
-        return len(v) == 0
-    return False
+# Fields whose absence counts against an invoice (see api.predict)
+CRITICAL_FIELDS = ("vendor_name", "invoice_number", "date", "tax_id", "currency")
 
-def count_missing(d: Dict[str, Any], keys: List[str]) -> int:
-    return sum(1 for k in keys if _is_missing(d.get(k)))
+def count_missing(d: Dict[str, Any], keys: Sequence[str] = CRITICAL_FIELDS) -> int:
+    """
+    Count keys whose value is missing: None, blank string, or empty container.
+    The checks are inlined (no helper call / generator per key) since this
+    runs on every request.
+    """
+    n = 0
+    for k in keys:
+        v = d.get(k)
+        if v is None:
+            n += 1
+        elif isinstance(v, str):
+            if not v.strip():
+                n += 1
+        elif isinstance(v, (list, dict, tuple, set)) and not v:
+            n += 1
+    return n
@@ -1,8 +1,26 @@
 # invoicex/scripts/make_synth.py
 from __future__ import annotations
-import json, random
+import os
+import shutil
+from multiprocessing import Pool
 from pathlib import Path
 from datetime import date, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+# orjson emits UTF-8 bytes directly and is several times faster; the script
+# still runs on the stdlib json if it isn't installed
+try:
+    import orjson
+
+    def _dumps(rec: dict) -> bytes:
+        return orjson.dumps(rec)
+except ImportError:
+    import json
+
+    def _dumps(rec: dict) -> bytes:
+        return json.dumps(rec, ensure_ascii=False).encode("utf-8")
 
 VENDORS_EN = ["Northwind Traders", "Acme Corp", "Globex", "Initech"]
 VENDORS_DE = ["Muster GmbH", "Beispiel AG", "Belege KG"]
@@ -17,54 +35,124 @@ ITEMS = [
 
 CURRENCIES = ["EUR", "EUR", "EUR", "SAR", "AED"]  # skew a bit toward EUR
 
-def rand_date():
-    start = date(2024, 1, 1)
-    delta = timedelta(days=random.randint(0, 600))
-    return (start + delta).isoformat()
-
-def make_record(i: int, lang: str) -> dict:
-    if lang == "de":
-        vendor = random.choice(VENDORS_DE)
-        tax_id = "DE" + "".join(random.choice("0123456789") for _ in range(9))
-    elif lang == "ar":
-        vendor = random.choice(VENDORS_AR)
-        tax_id = random.choice(["SA", "AE", "BH", "OM"]) + "".join(random.choice("0123456789") for _ in range(9))
-    else:
-        vendor = random.choice(VENDORS_EN)
-        tax_id = "FR" + "".join(random.choice("0123456789") for _ in range(9))
-
-    n_lines = random.randint(1, 4)
-    items = []
-    for _ in range(n_lines):
-        desc, cat, unit = random.choice(ITEMS)
-        items.append({
-            "description": desc,
-            "quantity": random.randint(1, 5),
-            "unit_price": unit,
-            "category": cat
-        })
-
-    inv_number = f"{vendor.split()[0][:3].upper()}-{i:05d}"
-    cur = random.choice(CURRENCIES)
+VENDORS = {"en": VENDORS_EN, "de": VENDORS_DE, "ar": VENDORS_AR}
+TAX_PREFIXES = {"en": ["FR"], "de": ["DE"], "ar": ["SA", "AE", "BH", "OM"]}
+
+DATE_START = date(2024, 1, 1)
+DATE_SPAN_DAYS = 600
+
+WRITE_BATCH = 8192  # records buffered per f.write() call
+
+# Parallel generation: below this many records per worker, process start-up
+# costs more than it saves
+MIN_RECORDS_PER_WORKER = 50_000
+COPY_CHUNK = 1 << 20  # bytes per read when concatenating shards
+
+def rand_date(offset_days: int) -> str:
+    return (DATE_START + timedelta(days=offset_days)).isoformat()
+
+@lru_cache(maxsize=None)
+def _vendor_prefix(vendor: str) -> str:
+    """Invoice-number prefix: first 3 letters of the vendor's first word (few distinct vendors)."""
+    return vendor.split()[0][:3].upper()
+
+def make_record(i: int, lang: str, vendor: str, tax_id: str, item_idx: list[int], quantities: list[int],
+                date_str: str, cur: str) -> dict:
+    # item_idx: one ITEMS index per line item
+    lines = [ITEMS[k] for k in item_idx]
+    items = [
+        {"description": desc, "quantity": qty, "unit_price": unit, "category": cat}
+        for (desc, cat, unit), qty in zip(lines, quantities)
+    ]
+
+    inv_number = f"{_vendor_prefix(vendor)}-{i:05d}"
     return {
         "vendor_name": vendor,
         "invoice_number": inv_number,
-        "date": rand_date(),
+        "date": date_str,
         "tax_id": tax_id,
         "items": items,
         "currency": cur,
         "language": lang,
-        "raw_text": f"{vendor} {inv_number} " + " ".join(x["description"] for x in items)
+        "raw_text": f"{vendor} {inv_number} " + " ".join(desc for desc, _, _ in lines)
     }
 
-def make_n(n: int, out_path: Path, langs: list[str]):
+def _gen_shard(start: int, end: int, langs: list[str], out_path: Path, seed: int | None) -> Path:
+    """Write records start..end-1 (invoice numbers use the global index) to out_path."""
+    n = end - start
+
+    # Draw every per-record random decision up front, one numpy call per column
+    # (unknown languages get the English vendors / tax prefix)
+    rng = np.random.default_rng(seed)
+    lang_arr = rng.choice(langs, size=n).tolist()
+    vendor_u = rng.random(n).tolist()  # uniform [0, 1) -> index into the language's vendor list
+    prefix_u = rng.random(n).tolist()
+    tax_nums = rng.integers(0, 10**9, size=n).tolist()  # 9 digits as one number, zero-padded below
+    n_lines_arr = rng.integers(1, 5, size=n).tolist()
+    date_offsets = rng.integers(0, DATE_SPAN_DAYS + 1, size=n).tolist()
+    cur_arr = rng.choice(CURRENCIES, size=n).tolist()
+
+    # ... and for the line items, one pool for all records: record j takes the
+    # next n_lines_arr[j] entries
+    n_items = sum(n_lines_arr)
+    item_idx = rng.integers(0, len(ITEMS), size=n_items).tolist()
+    quantities = rng.integers(1, 6, size=n_items).tolist()
+    pos = 0
+
+    # Accumulate encoded lines and write them in large chunks instead of one
+    # write() per record
+    buf = bytearray()
+    with out_path.open("wb") as f:
+        for j in range(n):
+            lang = lang_arr[j]
+            vendors = VENDORS.get(lang, VENDORS_EN)
+            prefixes = TAX_PREFIXES.get(lang, TAX_PREFIXES["en"])
+            rec = make_record(
+                start + j, lang,
+                vendor=vendors[int(vendor_u[j] * len(vendors))],
+                tax_id=f"{prefixes[int(prefix_u[j] * len(prefixes))]}{tax_nums[j]:09d}",
+                item_idx=item_idx[pos:pos + n_lines_arr[j]],
+                quantities=quantities[pos:pos + n_lines_arr[j]],
+                date_str=rand_date(date_offsets[j]),
+                cur=cur_arr[j],
+            )
+            pos += n_lines_arr[j]
+            buf += _dumps(rec)
+            buf += b"\n"
+            if (j + 1) % WRITE_BATCH == 0:
+                f.write(buf)
+                buf.clear()
+        f.write(buf)
+    return out_path
+
+def make_n(n: int, out_path: Path, langs: list[str], seed: int | None = None, workers: int = 1):
+    """
+    Write n records to out_path. With workers > 1 (and enough records to pay for
+    the process start-up) the index range is split into one shard per worker
+    process, each with its own generator (seed + k), then concatenated in order.
+    A fixed seed reproduces the same file for the same worker count.
+    """
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    with out_path.open("w", encoding="utf-8") as f:
-        for i in range(n):
-            lang = random.choice(langs)
-            rec = make_record(i, lang)
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-    print(f"[OK] wrote {n} records to {out_path}")
+    workers = max(1, min(workers, n // MIN_RECORDS_PER_WORKER))
+    if workers == 1:
+        _gen_shard(0, n, langs, out_path, seed)
+        print(f"[OK] wrote {n} records to {out_path}")
+        return
+
+    bounds = [n * k // workers for k in range(workers + 1)]
+    jobs = [
+        (bounds[k], bounds[k + 1], langs, out_path.with_suffix(f".{k}.jsonl"), None if seed is None else seed + k)
+        for k in range(workers)
+    ]
+    with Pool(workers) as pool:
+        shards = pool.starmap(_gen_shard, jobs)
+
+    with out_path.open("wb") as out:
+        for shard in shards:
+            with shard.open("rb") as f:
+                shutil.copyfileobj(f, out, COPY_CHUNK)
+            shard.unlink()
+    print(f"[OK] wrote {n} records to {out_path} ({workers} worker processes)")
 
 if __name__ == "__main__":
     import argparse
@@ -72,6 +160,9 @@ if __name__ == "__main__":
     parser.add_argument("--n", type=int, default=1000)
     parser.add_argument("--out", type=str, default=str(Path(__file__).resolve().parents[1] / "data" / "synth_invoices.jsonl"))
     parser.add_argument("--langs", nargs="+", default=["en", "de", "ar"])
+    parser.add_argument("--seed", type=int, default=None, help="fix the RNG for a reproducible dataset")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for large --n (one shard each)")
     args = parser.parse_args()
 
-    make_n(args.n, Path(args.out), args.langs)
+    make_n(args.n, Path(args.out), args.langs, seed=args.seed, workers=args.workers)
@@ -1,28 +1,46 @@
 from __future__ import annotations
-import json
+import re
 import random
+from collections import defaultdict
 from pathlib import Path
 from typing import List, Dict, Any
 
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import IsolationForest
 import joblib
 
+# orjson parses bytes directly (no per-line text decode); stdlib json also
+# accepts bytes, so fall back to it if orjson isn't installed
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
 # -------------------------------------------------------------------
 # Paths
 # -------------------------------------------------------------------
 ROOT = Path(__file__).resolve().parents[1]  # .../invoicex
 DATA_PATH = ROOT / "data" / "synth_invoices.jsonl"
+# Finalized training columns, reused while newer than DATA_PATH (needs pyarrow)
+DATA_CACHE_PATH = DATA_PATH.with_suffix(".parquet")
 MODEL_DIR = ROOT / "models"
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
 RNG = random.Random(42)
 
+# Classifier solver switch (see train_classifier)
+LIBLINEAR_MAX_ROWS = 2000
+
 # Keywords to help infer labels if we load an external JSONL
 MEDICAL_TOKENS = {"clinic", "patient", "procedure", "lab", "icd", "cpt", "insurance", "medical"}
 RECUR_TOKENS = {"subscription", "monthly", "auto-renew", "plan", "license", "billing", "cycle", "recurring"}
+# One regex scan per token set instead of one substring search per token
+# (plain alternation: substring semantics, same as `tok in text`)
+_MEDICAL_RE = re.compile("|".join(map(re.escape, sorted(MEDICAL_TOKENS))))
+_RECUR_RE = re.compile("|".join(map(re.escape, sorted(RECUR_TOKENS))))
 
 # -------------------------------------------------------------------
 # Data loading / synthesis
@@ -59,11 +77,14 @@ def _synth_row(label: str, i: int) -> Dict[str, Any]:
 
 def _synthesize_dataset(n_per_class: int = 200) -> pd.DataFrame:
     labels = ["product-based", "service-based", "medical", "recurring"]
-    rows: List[Dict[str, Any]] = []
+    # Collect column lists directly: pandas wraps each list as a column instead
+    # of bucketing a list of row dicts
+    columns: Dict[str, List[Any]] = defaultdict(list)
     for lbl in labels:
         for i in range(n_per_class):
-            rows.append(_synth_row(lbl, i))
-    df = pd.DataFrame(rows)
+            for key, value in _synth_row(lbl, i).items():
+                columns[key].append(value)
+    df = pd.DataFrame(columns)
     return _finalize_df(df)
 
 def _infer_label_from_row(row: Dict[str, Any]) -> str:
@@ -73,10 +94,11 @@ def _infer_label_from_row(row: Dict[str, Any]) -> str:
         return str(row["label"])
 
     # 2) Heuristics: tokens in raw_text
-    text = " ".join([str(row.get("raw_text") or "")]).lower()
-    if any(tok in text for tok in MEDICAL_TOKENS):
+    # Lowered once, then scanned by both keyword regexes
+    text = str(row.get("raw_text") or "").lower()
+    if _MEDICAL_RE.search(text):
         return "medical"
-    if any(tok in text for tok in RECUR_TOKENS):
+    if _RECUR_RE.search(text):
         return "recurring"
 
     # 3) Heuristics: item categories
@@ -87,40 +109,96 @@ def _infer_label_from_row(row: Dict[str, Any]) -> str:
     # default
     return "product-based"
 
+def _column(df: pd.DataFrame, name: str) -> list:
+    """Column values as a plain list (all None if the column is absent)."""
+    return df[name].tolist() if name in df.columns else [None] * len(df)
+
+def _invoice_totals(items_col: list) -> np.ndarray:
+    """
+    sum(quantity * unit_price) per invoice as one segment sum: flatten all line
+    items into two arrays, then add each line's product into its invoice's slot.
+    """
+    lengths = np.fromiter(map(len, items_col), dtype=np.intp, count=len(items_col))
+    lines = [it for its in items_col for it in its]
+    qty = np.fromiter((it.get("quantity", 0) for it in lines), dtype=np.float64, count=len(lines))
+    price = np.fromiter((it.get("unit_price", 0.0) for it in lines), dtype=np.float64, count=len(lines))
+    rows = np.repeat(np.arange(len(items_col)), lengths)
+    # bincount (unlike np.add.reduceat) gives 0 for invoices without lines;
+    # the cast covers numpy returning int64 when there are no lines at all
+    totals = np.bincount(rows, weights=qty * price, minlength=len(items_col))
+    return totals.astype(np.float64, copy=False)
+
 def _finalize_df(df: pd.DataFrame) -> pd.DataFrame:
-    """Build helper columns used by models."""
+    """
+    Build helper columns used by models.
+    Adds the columns to df in place (and returns it): callers pass a freshly
+    built frame, so there is no defensive copy.
+    """
+    # Plain Python loops over the column values instead of row-wise df.apply
+    # (which builds a Series per row)
+    items_col = [its or [] for its in _column(df, "items")]
+
     # full_text = vendor, invoice id, item descriptions, raw_text (if present)
-    def join_text(r):
-        desc = " ".join([str(it.get("description") or "") for it in (r.get("items") or [])])
-        return " ".join([str(r.get("vendor_name") or ""),
-                         str(r.get("invoice_number") or ""),
-                         desc,
-                         str(r.get("raw_text") or "")]).strip()
-
-    df = df.copy()
-    df["full_text"] = df.apply(join_text, axis=1)
-    df["total_amount"] = df["items"].apply(lambda items: sum((it.get("quantity", 0) * it.get("unit_price", 0.0)) for it in items))
-    df["line_count"] = df["items"].apply(lambda items: len(items or []))
+    full_text = [
+        " ".join([str(vendor or ""),
+                  str(inv_no or ""),
+                  " ".join([str(it.get("description") or "") for it in its]),
+                  str(raw or "")]).strip()
+        for vendor, inv_no, its, raw in zip(
+            _column(df, "vendor_name"), _column(df, "invoice_number"), items_col, _column(df, "raw_text")
+        )
+    ]
+
+    df["full_text"] = full_text
+    df["total_amount"] = _invoice_totals(items_col)
+    df["line_count"] = df["items"].str.len().fillna(0).astype(np.int64)  # None -> 0, as len(items or [])
     return df
 
+# Columns the training functions use (and all the Parquet cache stores: the
+# nested items lists would come back from Parquet as numpy arrays)
+MODEL_COLUMNS = ["label", "full_text", "total_amount", "line_count"]
+
+def _read_cache() -> pd.DataFrame | None:
+    try:
+        if DATA_CACHE_PATH.stat().st_mtime >= DATA_PATH.stat().st_mtime:
+            return pd.read_parquet(DATA_CACHE_PATH, engine="pyarrow")
+    except Exception:
+        pass  # no cache yet, pyarrow not installed, or unreadable file
+    return None
+
+def _write_cache(df: pd.DataFrame) -> None:
+    try:
+        df[MODEL_COLUMNS].to_parquet(DATA_CACHE_PATH, engine="pyarrow", compression="zstd", index=False)
+    except Exception:
+        # Optional speedup only; don't leave a partial file behind
+        DATA_CACHE_PATH.unlink(missing_ok=True)
+
 def load_data() -> pd.DataFrame:
     """
     Load JSONL if available; otherwise synthesize a balanced dataset.
     Ensures df has columns: label, full_text, total_amount, line_count.
+    When served from the Parquet cache, df has only those columns.
     """
     if DATA_PATH.exists():
-        rows: List[Dict[str, Any]] = []
-        with DATA_PATH.open("r", encoding="utf-8") as f:
-            for line in f:
-                row = json.loads(line)
-                # inject label if missing
-                if "label" not in row or not row["label"]:
-                    row["label"] = _infer_label_from_row(row)
-                rows.append(row)
+        cached = _read_cache()
+        if cached is not None:
+            return cached
+
+        rows: List[Dict[str, Any]] = [_loads(line) for line in DATA_PATH.read_bytes().splitlines() if line]
+        for row in rows:
+            # inject label if missing
+            if "label" not in row or not row["label"]:
+                row["label"] = _infer_label_from_row(row)
         df = pd.DataFrame(rows)
         if "label" not in df.columns:
-            df["label"] = df.apply(lambda r: _infer_label_from_row(r.to_dict()), axis=1)
-        return _finalize_df(df)
+            # It only reads raw_text / items: pass those directly, no per-row Series.to_dict()
+            df["label"] = [
+                _infer_label_from_row({"raw_text": raw, "items": its})
+                for raw, its in zip(_column(df, "raw_text"), _column(df, "items"))
+            ]
+        df = _finalize_df(df)
+        _write_cache(df)
+        return df
 
     # No file? Build synthetic data with 4 labels.
     return _synthesize_dataset(n_per_class=200)
@@ -129,30 +207,105 @@ def load_data() -> pd.DataFrame:
 # Training
 # -------------------------------------------------------------------
 def train_classifier(df: pd.DataFrame) -> None:
-    vec = TfidfVectorizer(min_df=1, max_features=5000, ngram_range=(1, 2))
+    # float32 TF-IDF halves the matrix footprint; the vocabulary is kept (not
+    # hashed) because explain.py reports token names from it
+    vec = TfidfVectorizer(min_df=1, max_features=5000, ngram_range=(1, 2), dtype=np.float32)
     X = vec.fit_transform(df["full_text"])
     y = df["label"]
 
-    clf = LogisticRegression(max_iter=300, multi_class="auto", solver="lbfgs")
+    # liblinear has the tightest inner loop on small sparse problems but is
+    # binary-only (one-vs-rest for more classes, deprecated in newer sklearn);
+    # saga scales to larger corpora and handles multinomial directly
+    solver = "liblinear" if X.shape[0] < LIBLINEAR_MAX_ROWS and y.nunique() <= 2 else "saga"
+    clf = LogisticRegression(solver=solver, max_iter=200, tol=1e-3)
     clf.fit(X, y)
 
     joblib.dump(vec, MODEL_DIR / "vectorizer.joblib")
     joblib.dump(clf, MODEL_DIR / "type_classifier.joblib")
-    print("[OK] Saved classifier + vectorizer -> models/vectorizer.joblib, models/type_classifier.joblib")
+    print(f"[OK] Saved classifier ({solver}) + vectorizer -> models/vectorizer.joblib, models/type_classifier.joblib")
 
 def train_iforest(df: pd.DataFrame) -> None:
-    X = df[["total_amount", "line_count"]].values
-    iforest = IsolationForest(n_estimators=200, contamination=0.05, random_state=0)
+    # The trees split on float32 anyway: passing it directly skips a converted copy
+    X = df[["total_amount", "line_count"]].to_numpy(dtype=np.float32)
+    # Trees are independent -> fit them on all cores; max_samples pinned to the
+    # "auto" value (min(256, n)) so trees stay shallow whatever the dataset size
+    iforest = IsolationForest(
+        n_estimators=200, contamination=0.05, random_state=0,
+        max_samples=min(256, len(X)), n_jobs=-1,
+    )
     iforest.fit(X)
     joblib.dump(iforest, MODEL_DIR / "anomaly_iforest.joblib")
     print("[OK] Saved anomaly IsolationForest -> models/anomaly_iforest.joblib")
 
+def train_isotree(df: pd.DataFrame, contamination: float = 0.05) -> None:
+    """
+    Optional: the same two-feature model with isotree's multithreaded C++
+    IsolationForest. The API prefers it when models/anomaly_isotree.joblib loads.
+    """
+    path = MODEL_DIR / "anomaly_isotree.joblib"
+    try:
+        from isotree import IsolationForest as IsoTreeForest
+    except ImportError:
+        # Don't leave a model trained on older data next to the new sklearn one
+        path.unlink(missing_ok=True)
+        print("[SKIP] isotree not installed -> API keeps the sklearn IsolationForest")
+        return
+
+    X = df[["total_amount", "line_count"]].to_numpy(dtype=float)
+    iso = IsoTreeForest(
+        ntrees=200, sample_size=min(256, len(X)), ndim=1,
+        missing_action="fail", nthreads=-1, random_seed=0,
+    )
+    iso.fit(X)
+    iso.build_indexer(with_distances=False)  # faster terminal-node lookups at predict time
+
+    # Same threshold sklearn derives from `contamination` (offset_), so the API's
+    # 0..1 risk conversion stays unchanged
+    offset = float(np.percentile(-iso.predict(X, output="score"), 100.0 * contamination))
+    joblib.dump({"model": iso, "offset": offset}, path)
+    print("[OK] Saved isotree IsolationForest -> models/anomaly_isotree.joblib")
+
+def export_classifier_onnx() -> None:
+    """
+    Optional: export the saved vectorizer + classifier as one ONNX graph, so the
+    API runs tokenize -> TF-IDF -> logistic regression in a single ONNX Runtime call.
+    """
+    path = MODEL_DIR / "type_pipeline.onnx"
+    try:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import StringTensorType
+        from sklearn.pipeline import Pipeline
+    except ImportError:
+        # Don't leave a graph exported from older models next to the new joblib files
+        path.unlink(missing_ok=True)
+        print("[SKIP] skl2onnx not installed -> API keeps the sklearn classifier")
+        return
+
+    # Export exactly what the API loads
+    vec = joblib.load(MODEL_DIR / "vectorizer.joblib")
+    clf = joblib.load(MODEL_DIR / "type_classifier.joblib")
+    options = {
+        # ONNX's tokenizer uses RE2, where \w is ASCII-only; spell out the Unicode
+        # classes so Arabic text tokenizes like sklearn's (?u)\b\w\w+\b
+        id(vec): {"tokenexp": r"[\p{L}\p{N}_][\p{L}\p{N}_]+", "locale": "C"},
+        id(clf): {"zipmap": False},  # plain probability matrix instead of a list of dicts
+    }
+    onx = convert_sklearn(
+        Pipeline([("vec", vec), ("clf", clf)]),
+        initial_types=[("input", StringTensorType([None]))],
+        options=options,
+    )
+    path.write_bytes(onx.SerializeToString())
+    print("[OK] Saved ONNX classifier pipeline -> models/type_pipeline.onnx")
+
 # -------------------------------------------------------------------
 def main():
     df = load_data()
     print(f"Training on {len(df)} rows with labels:", dict(df["label"].value_counts()))
     train_classifier(df)
+    export_classifier_onnx()
     train_iforest(df)
+    train_isotree(df)
 
 if __name__ == "__main__":
     main()